@@ -0,0 +1,448 @@
+"""
+Lightweight JSON + Server-Sent-Events chat API for embedding on a personal website.
+Reuses the same EnhancedMe engine as the Gradio app and keeps chat history server-side.
+"""
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import gradio as gr
+from fastapi import FastAPI, HTTPException
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+
+from app import BUSY_MESSAGE, ERROR_MESSAGE, EnhancedMe, create_interface
+from data_sources import create_default_config
+from llm_scheduler import SchedulerBusy
+from profile_snapshot import ProfileSnapshotReader, run_refresher
+
+
+class ChatSessionStore:
+    """In-memory chat histories keyed by session id, with idle expiry."""
+
+    def __init__(self, ttl: float = 3600, max_sessions: int = 1000, max_messages: int = 20):
+        """
+        Initialize the session store.
+
+        Args:
+            ttl: Seconds of inactivity before a session is discarded
+            max_sessions: Maximum sessions kept (least recently used are evicted)
+            max_messages: Maximum history messages kept per session
+        """
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self._sessions = OrderedDict()  # session id -> {"history": [...], "last_seen": float}
+        self._lock = threading.Lock()
+
+    def resolve(self, session_id: Optional[str]) -> str:
+        """Return `session_id` if it is live, otherwise start a new session."""
+        with self._lock:
+            self._expire()
+            if session_id in self._sessions:
+                self._touch(session_id)
+                return session_id
+            session_id = uuid.uuid4().hex
+            self._sessions[session_id] = {"history": [], "last_seen": time.monotonic()}
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session_id
+
+    def history(self, session_id: str) -> List[Dict]:
+        """Copy of a session's chat history."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return list(session["history"]) if session else []
+
+    def append(self, session_id: str, user_message: str, reply: str):
+        """Record a completed exchange."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            session["history"] += [
+                {"role": "user", "content": user_message},
+                {"role": "assistant", "content": reply},
+            ]
+            session["history"] = session["history"][-self.max_messages:]
+            self._touch(session_id)
+
+    def delete(self, session_id: str):
+        """Forget a session."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _touch(self, session_id: str):
+        self._sessions[session_id]["last_seen"] = time.monotonic()
+        self._sessions.move_to_end(session_id)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session["last_seen"] >= cutoff:
+                break
+            del self._sessions[session_id]
+
+
+class SqliteSessionStore:
+    """Chat histories in a SQLite file, so every worker process sees the same sessions."""
+
+    def __init__(self, path: str, ttl: float = 3600, max_sessions: int = 1000, max_messages: int = 20):
+        """
+        Initialize the session store, creating the database if needed.
+
+        Args:
+            path: SQLite database file shared by the workers
+            ttl: Seconds of inactivity before a session is discarded
+            max_sessions: Maximum sessions kept (least recently used are evicted)
+            max_messages: Maximum history messages kept per session
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        with self._db() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions "
+                "(id TEXT PRIMARY KEY, history TEXT NOT NULL, last_seen REAL NOT NULL)"
+            )
+
+    def resolve(self, session_id: Optional[str]) -> str:
+        """Return `session_id` if it is live, otherwise start a new session."""
+        now = time.time()
+        with self._db() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM sessions WHERE last_seen < ?", (now - self.ttl,))
+            if session_id and db.execute("UPDATE sessions SET last_seen = ? WHERE id = ?", (now, session_id)).rowcount:
+                db.execute("COMMIT")
+                return session_id
+            session_id = uuid.uuid4().hex
+            db.execute("INSERT INTO sessions VALUES (?, '[]', ?)", (session_id, now))
+            db.execute(
+                "DELETE FROM sessions WHERE id NOT IN "
+                "(SELECT id FROM sessions ORDER BY last_seen DESC LIMIT ?)",
+                (self.max_sessions,),
+            )
+            db.execute("COMMIT")
+            return session_id
+
+    def history(self, session_id: str) -> List[Dict]:
+        """Copy of a session's chat history."""
+        with self._db() as db:
+            row = db.execute("SELECT history FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def append(self, session_id: str, user_message: str, reply: str):
+        """Record a completed exchange."""
+        with self._db() as db:
+            # Read-modify-write under the write lock so concurrent workers don't drop messages
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT history FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is not None:
+                history = json.loads(row[0]) + [
+                    {"role": "user", "content": user_message},
+                    {"role": "assistant", "content": reply},
+                ]
+                db.execute(
+                    "UPDATE sessions SET history = ?, last_seen = ? WHERE id = ?",
+                    (json.dumps(history[-self.max_messages:]), time.time(), session_id),
+                )
+            db.execute("COMMIT")
+
+    def delete(self, session_id: str):
+        """Forget a session."""
+        with self._db() as db:
+            db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    @contextmanager
+    def _db(self):
+        # Autocommit connection per call; transactions are opened explicitly where needed
+        db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+class ChatRequest(BaseModel):
+    """Body for the chat endpoints: only the new message is sent."""
+    message: str
+    session_id: Optional[str] = None
+
+
+def _sse(data: Dict, event: Optional[str] = None) -> str:
+    """Format one Server-Sent-Events message."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def create_api(enhanced_me: EnhancedMe) -> FastAPI:
+    """Create the JSON/SSE chat API around an EnhancedMe instance."""
+    config = enhanced_me.config
+    store_options = dict(
+        ttl=config.get("api_session_ttl", 3600),
+        max_sessions=config.get("api_max_sessions", 1000),
+        max_messages=config.get("api_max_history_messages", 20),
+    )
+    # Workers don't share memory, so multi-worker deployments keep sessions in SQLite
+    session_db = config.get("api_session_db")
+    sessions = SqliteSessionStore(session_db, **store_options) if session_db else ChatSessionStore(**store_options)
+
+    api = FastAPI(title=f"Chat with {enhanced_me.name}")
+    api.add_middleware(
+        CORSMiddleware,
+        allow_origins=config.get("api_allowed_origins", ["*"]),
+        allow_methods=["GET", "POST", "DELETE"],
+        allow_headers=["Content-Type"],
+    )
+
+    @api.post("/api/session")
+    def create_session():
+        return {"session_id": sessions.resolve(None)}
+
+    @api.delete("/api/session/{session_id}")
+    def delete_session(session_id: str):
+        sessions.delete(session_id)
+        return {"deleted": session_id}
+
+    @api.post("/api/chat")
+    def chat(request: ChatRequest):
+        session_id = sessions.resolve(request.session_id)
+        try:
+            reply = enhanced_me.respond(request.message, sessions.history(session_id), session_id=session_id)["content"]
+        except SchedulerBusy:
+            raise HTTPException(status_code=503, detail=BUSY_MESSAGE)
+        except Exception as e:
+            print(f"Error in API chat: {e}")
+            raise HTTPException(status_code=500, detail=ERROR_MESSAGE)
+        sessions.append(session_id, request.message, reply)
+        return {"session_id": session_id, "reply": reply}
+
+    @api.post("/api/chat/stream")
+    def chat_stream(request: ChatRequest):
+        session_id = sessions.resolve(request.session_id)
+        history = sessions.history(session_id)
+
+        def events():
+            yield _sse({"session_id": session_id}, event="session")
+            parts = []
+            try:
+                for delta in enhanced_me.stream_reply(request.message, history, session_id=session_id):
+                    parts.append(delta)
+                    yield _sse({"delta": delta})
+            except SchedulerBusy:
+                yield _sse({"message": BUSY_MESSAGE}, event="error")
+                return
+            except Exception as e:
+                print(f"Error in API stream: {e}")
+                yield _sse({"message": ERROR_MESSAGE}, event="error")
+                return
+            sessions.append(session_id, request.message, "".join(parts))
+            yield _sse({}, event="done")
+
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @api.get("/api/stats")
+    def stats():
+        snapshot = enhanced_me.profile_snapshot
+        return dict(
+            enhanced_me.scheduler.stats(),
+            pid=os.getpid(),
+            profile_generation=snapshot.generation if snapshot else None,
+        )
+
+    @api.get("/widget.js")
+    def widget():
+        script = WIDGET_JS.replace("__BUSY_MESSAGE__", json.dumps(BUSY_MESSAGE))
+        script = script.replace("__ERROR_MESSAGE__", json.dumps(ERROR_MESSAGE))
+        return Response(script, media_type="application/javascript")
+
+    return api
+
+
+# Embeddable client: <script src="https://your-host/widget.js" defer></script>
+WIDGET_JS = r"""
+(() => {
+  const script = document.currentScript;
+  const base = script.dataset.api || new URL(script.src).origin;
+  const key = "alterEgoSession";
+  const BUSY = __BUSY_MESSAGE__;
+  const ERROR = __ERROR_MESSAGE__;
+  const box = document.createElement("div");
+  box.style.cssText = "position:fixed;bottom:16px;right:16px;width:320px;font:14px sans-serif;" +
+    "background:#fff;border:1px solid #ccc;border-radius:8px;box-shadow:0 2px 8px rgba(0,0,0,.15);z-index:9999";
+  box.innerHTML = '<div class="log" style="height:300px;overflow-y:auto;padding:8px"></div>' +
+    '<form style="display:flex;border-top:1px solid #eee"><input style="flex:1;border:0;padding:8px" ' +
+    'placeholder="Ask me anything..."><button style="border:0;padding:8px">Send</button></form>';
+  document.body.appendChild(box);
+  const log = box.querySelector(".log");
+  const input = box.querySelector("input");
+
+  const bubble = (who, text) => {
+    const p = document.createElement("p");
+    p.style.margin = "4px 0";
+    p.innerHTML = "<b></b> <span></span>";
+    p.querySelector("b").textContent = who;
+    p.querySelector("span").textContent = text;
+    log.appendChild(p);
+    log.scrollTop = log.scrollHeight;
+    return p.querySelector("span");
+  };
+
+  box.querySelector("form").addEventListener("submit", async (e) => {
+    e.preventDefault();
+    const message = input.value.trim();
+    if (!message) return;
+    input.value = "";
+    bubble("You:", message);
+    const out = bubble("Me:", "");
+    try {
+      const res = await fetch(base + "/api/chat/stream", {
+        method: "POST",
+        headers: {"Content-Type": "application/json"},
+        body: JSON.stringify({message, session_id: sessionStorage.getItem(key)}),
+      });
+      if (!res.ok || !res.body) {
+        out.textContent = res.status === 503 || res.status === 429 ? BUSY : ERROR;
+        return;
+      }
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      for (;;) {
+        const {done, value} = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, {stream: true});
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const raw of events) {
+          const event = (raw.match(/^event: (.*)$/m) || [])[1];
+          const data = JSON.parse((raw.match(/^data: (.*)$/m) || [])[1] || "{}");
+          if (event === "session") sessionStorage.setItem(key, data.session_id);
+          else if (event === "error") out.textContent = data.message || ERROR;
+          else if (data.delta) out.textContent += data.delta;
+          log.scrollTop = log.scrollHeight;
+        }
+      }
+      if (!out.textContent) out.textContent = ERROR;
+    } catch (err) {
+      // Network failure or a connection dropped mid-stream
+      out.textContent = out.textContent ? out.textContent + " " + ERROR : ERROR;
+    }
+  });
+})();
+"""
+
+
+# Worker processes are started by uvicorn, so main() hands them its config through the environment
+CONFIG_ENV = "ALTER_EGO_CONFIG"
+
+
+def create_app(config: Optional[Dict] = None) -> FastAPI:
+    """
+    Build the chat API for one worker process, with the Gradio UI mounted when single-worker.
+
+    Args:
+        config: Application configuration (defaults to the one serialized by main(),
+            falling back to create_default_config())
+    """
+    if config is None:
+        serialized = os.getenv(CONFIG_ENV)
+        config = json.loads(serialized) if serialized else create_default_config()
+    workers = config.get("api_workers", 1)
+    if workers > 1:
+        # Each worker has its own scheduler, so give each one its share of the LLM budget
+        config = dict(
+            config,
+            llm_rpm=_worker_share(config.get("llm_rpm"), workers),
+            llm_tpm=_worker_share(config.get("llm_tpm"), workers),
+        )
+    enhanced_me = EnhancedMe(config)
+    api = create_api(enhanced_me)
+    if workers > 1:
+        # Gradio's queue and event streams live in a single process, so the UI isn't mounted here
+        return api
+    # Mount the full Gradio UI on the same engine
+    return gr.mount_gradio_app(api, create_interface(enhanced_me), path="/")
+
+
+def _worker_share(budget: Optional[int], workers: int) -> Optional[int]:
+    """Split a per-minute budget evenly across workers (None stays unlimited)."""
+    return None if budget is None else max(1, budget // workers)
+
+
+def wait_for_snapshot(path: str, newer_than: int, timeout: float = 120) -> bool:
+    """Wait until a snapshot newer than generation `newer_than` is published at `path`."""
+    reader = ProfileSnapshotReader(path)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            reader.get("full")
+            if reader.generation > newer_than:
+                return True
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def published_generation(path: str) -> int:
+    """Generation of a snapshot already at `path` (e.g. left over from a previous run), or 0."""
+    reader = ProfileSnapshotReader(path)
+    try:
+        reader.get("full")
+    except (OSError, ValueError, KeyError):
+        return 0
+    return reader.generation
+
+
+def main(config: Optional[Dict] = None):
+    """Serve the chat API and the Gradio UI, or the API alone across several workers."""
+    import uvicorn
+
+    config = config or create_default_config()
+    host, port = config.get("api_host", "127.0.0.1"), config.get("api_port", 7860)
+    workers = config.get("api_workers", 1)
+
+    if workers <= 1:
+        print(f"Serving chat API for {config['name']}: POST /api/chat/stream, widget at /widget.js")
+        uvicorn.run(create_app(config), host=host, port=port)
+        return
+
+    # Workers share one memory-mapped profile kept fresh by a single refresher process
+    config["profile_snapshot_path"] = config.get("profile_snapshot_path") or "profile.snap"
+    snapshot_path = config["profile_snapshot_path"]
+    config["api_session_db"] = config.get("api_session_db") or "sessions.db"
+    os.environ[CONFIG_ENV] = json.dumps(config)
+
+    # A snapshot left by a previous run may be stale, so wait for this refresher's first one
+    stale_generation = published_generation(snapshot_path)
+    refresher = multiprocessing.Process(target=run_refresher, args=(config, snapshot_path), daemon=True)
+    refresher.start()
+    if not wait_for_snapshot(snapshot_path, newer_than=stale_generation):
+        print(f"Warning: no fresh profile snapshot at {snapshot_path} yet, starting workers anyway")
+
+    print(f"Serving chat API for {config['name']} with {workers} workers sharing {snapshot_path} "
+          f"and sessions in {config['api_session_db']} (run app.py separately for the Gradio UI)")
+    try:
+        uvicorn.run("api:create_app", factory=True, host=host, port=port, workers=workers)
+    finally:
+        refresher.terminate()
+
+
+if __name__ == "__main__":
+    main()
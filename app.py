@@ -3,17 +3,23 @@ Enhanced LLM Alter Ego - AI-powered personal assistant chatbot.
 Features real-time GitHub integration, modular data sources, and improved tool management.
 """
 from dotenv import load_dotenv
-from openai import OpenAI
 import gradio as gr
 import os
+from typing import Dict
 
 from utils import handle_tool_calls, DEFAULT_TOOLS
 from data_sources import DataSourceManager, create_default_config
 from prompts import get_prompt
+from llm_router import LLMRouter, accumulate_chunks
+from llm_scheduler import RequestScheduler, SchedulerBusy, estimate_request_tokens, retry_after_seconds
+from profile_snapshot import ProfileSnapshotReader
 
 
 load_dotenv(override=True)
 
+BUSY_MESSAGE = "I'm talking with quite a few visitors right now. Please try again in a few seconds!"
+ERROR_MESSAGE = "I apologize, but I'm experiencing some technical difficulties. Please try again in a moment."
+
 
 class EnhancedMe:
     """Enhanced personal AI assistant with multi-source data integration."""
@@ -25,24 +31,39 @@ class EnhancedMe:
         Args:
             config: Optional configuration dictionary
         """
-        self.openai = OpenAI()
-        
         # Use provided config or create default
         self.config = config or create_default_config()
+        
+        # Hedged/fallback routing across the configured LLM endpoints
+        self.llm = LLMRouter.from_config(self.config)
+        # RPM/TPM budgeting and fair queuing across visitor sessions
+        self.scheduler = RequestScheduler.from_config(self.config)
         self.name = self.config.get("name", "Adrian Monge")
         self.prompt_style = self.config.get("prompt_style", "main")  # Allow prompt style configuration
+        self.context_mode = self.config.get("context_mode", "full")  # "full" or "no_github"
         
         # Initialize data source manager
         self.data_manager = DataSourceManager(self.config)
         
+        # Shared memory-mapped profile published by a refresher process (multi-worker mode)
+        snapshot_path = self.config.get("profile_snapshot_path")
+        self.profile_snapshot = ProfileSnapshotReader(snapshot_path) if snapshot_path else None
+        
         # Cache for profile data (refreshed periodically)
         self._profile_cache = None
         self._last_profile_update = None
 
     def get_profile_data(self, force_refresh: bool = False) -> str:
         """Get comprehensive profile data from all sources."""
+        if self.profile_snapshot is not None:
+            try:
+                return self.profile_snapshot.get(self.context_mode)
+            except (OSError, KeyError, ValueError) as e:
+                print(f"Profile snapshot unavailable, loading locally: {e}")
+        
+        include_github = self.context_mode != "no_github"
         try:
-            return self.data_manager.get_comprehensive_profile(include_github=True)
+            return self.data_manager.get_comprehensive_profile(include_github=include_github)
         except Exception as e:
             print(f"Error getting profile data: {e}")
             # Fallback to basic data if there's an error
@@ -59,51 +80,138 @@ class EnhancedMe:
         # Combine prompt with profile data
         return base_prompt + profile_data + f"\n\nWith this context, please chat with the user, always staying in character as {self.name}."
 
-    def chat(self, message, history):
+    def respond(self, message, history, tool_handler=handle_tool_calls, session_id: str = "default") -> Dict:
         """
-        Main chat function that handles conversation flow.
+        Run one conversation turn and return the reply with usage details.
         
         Args:
             message: User's current message
             history: Chat history in Gradio format
+            tool_handler: Function that executes tool calls and returns tool messages
+            session_id: Visitor session, used by the scheduler for fair queuing
             
         Returns:
-            AI assistant's response
+            Dictionary with the reply content, token usage and names of tools called
         """
         # Build messages for OpenAI API
         messages = [{"role": "system", "content": self.system_prompt()}] + history + [{"role": "user", "content": message}]
+        result = {"content": None, "prompt_tokens": 0, "completion_tokens": 0, "tool_calls": []}
         
         # Handle conversation with potential tool calls
         done = False
         while not done:
-            try:
-                response = self.openai.chat.completions.create(
-                    model="gpt-4o-mini", 
-                    messages=messages, 
-                    tools=DEFAULT_TOOLS
-                )
+            estimated_tokens = estimate_request_tokens(
+                messages, DEFAULT_TOOLS, self.config.get("llm_max_output_tokens", 500)
+            )
+            response = self.scheduler.submit(
+                session_id,
+                estimated_tokens,
+                lambda: self.llm.create(
+                    messages=messages, tools=DEFAULT_TOOLS, admit_extra=self._extra_attempt_budget(estimated_tokens)
+                ),
+            )
+            if response.usage:
+                result["prompt_tokens"] += response.usage.prompt_tokens
+                result["completion_tokens"] += response.usage.completion_tokens
+            
+            if response.choices[0].finish_reason == "tool_calls":
+                # Handle tool calls
+                message_with_tools = response.choices[0].message
+                tool_calls = message_with_tools.tool_calls
+                result["tool_calls"].extend(call.function.name for call in tool_calls)
+                tool_results = tool_handler(tool_calls)
                 
-                if response.choices[0].finish_reason == "tool_calls":
-                    # Handle tool calls
-                    message_with_tools = response.choices[0].message
-                    tool_calls = message_with_tools.tool_calls
-                    tool_results = handle_tool_calls(tool_calls)
-                    
-                    # Add tool call and results to message history
-                    messages.append(message_with_tools)
-                    messages.extend(tool_results)
-                else:
-                    # No more tool calls, we're done
-                    done = True
-                    
-            except Exception as e:
-                print(f"Error in chat: {e}")
-                return f"I apologize, but I'm experiencing some technical difficulties. Please try again in a moment."
-        
-        return response.choices[0].message.content
+                # Add tool call and results to message history
+                messages.append(message_with_tools)
+                messages.extend(tool_results)
+            else:
+                # No more tool calls, we're done
+                done = True
+        
+        result["content"] = response.choices[0].message.content
+        return result
+
+    def _extra_attempt_budget(self, estimated_tokens: int):
+        """Callback for the router that charges hedges and fallbacks to the scheduler's budget."""
+        return lambda: self.scheduler.try_acquire(estimated_tokens) is not None
+
+    def stream_reply(self, message, history, session_id: str = "default", tool_handler=handle_tool_calls):
+        """
+        Run one conversation turn, yielding reply text as it is generated.
+        
+        Args:
+            message: User's current message
+            history: Chat history as a list of role/content messages
+            session_id: Visitor session, used by the scheduler for fair queuing
+            tool_handler: Function that executes tool calls and returns tool messages
+            
+        Yields:
+            Text deltas of the assistant's reply
+        """
+        messages = [{"role": "system", "content": self.system_prompt()}] + history + [{"role": "user", "content": message}]
+        
+        while True:
+            estimated_tokens = estimate_request_tokens(
+                messages, DEFAULT_TOOLS, self.config.get("llm_max_output_tokens", 500)
+            )
+            for attempt in range(self.scheduler.retries + 1):
+                chunks = []
+                try:
+                    with self.scheduler.slot(session_id, estimated_tokens) as entry:
+                        for chunk in self.llm.stream(
+                            messages=messages, tools=DEFAULT_TOOLS,
+                            admit_extra=self._extra_attempt_budget(estimated_tokens),
+                        ):
+                            chunks.append(chunk)
+                            for choice in chunk.choices:
+                                if choice.delta.content:
+                                    yield choice.delta.content
+                    break
+                except Exception as e:
+                    # 429s arrive before the first chunk; the slot already paused for Retry-After
+                    if retry_after_seconds(e) is None:
+                        raise
+                    if chunks or attempt == self.scheduler.retries:
+                        raise SchedulerBusy("LLM still rate limited after retries") from e
+            
+            response = accumulate_chunks(chunks)
+            if response.usage:
+                self.scheduler.record_usage(entry, response.usage.total_tokens)
+            if response.choices[0].finish_reason != "tool_calls":
+                return
+            
+            # Handle tool calls, then stream the follow-up answer
+            message_with_tools = response.choices[0].message
+            messages.append(message_with_tools)
+            messages.extend(tool_handler(message_with_tools.tool_calls))
+
+    def chat(self, message, history, request: gr.Request = None):
+        """
+        Main chat function that handles conversation flow.
+        
+        Args:
+            message: User's current message
+            history: Chat history in Gradio format
+            request: Gradio request, used to identify the visitor session
+            
+        Returns:
+            AI assistant's response
+        """
+        session_id = request.session_hash if request else "default"
+        try:
+            return self.respond(message, history, session_id=session_id)["content"]
+        except SchedulerBusy as e:
+            print(f"Scheduler busy: {e} ({self.scheduler.stats()})")
+            return BUSY_MESSAGE
+        except Exception as e:
+            print(f"Error in chat: {e}")
+            return ERROR_MESSAGE
 
     def refresh_data(self):
         """Manually refresh all data sources."""
+        if self.profile_snapshot is not None:
+            print("Profile data is refreshed by the snapshot refresher process")
+            return
         print("Refreshing profile data...")
         self._profile_cache = None
         # Force refresh GitHub data
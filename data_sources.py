@@ -3,11 +3,16 @@ Data sources manager for the LLM Alter Ego chatbot.
 Combines PDF, summary text, and GitHub API data sources.
 """
 import os
+import threading
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from pypdf import PdfReader
 
 from github_api import get_github_data_for_user
+from profile_compaction import compact_sections, format_report, render_sections
+
+# Heading placed before each profile section, in output order
+PROFILE_HEADINGS = {"summary": "## Summary\n", "linkedin": "## LinkedIn Profile\n", "github": ""}
 
 
 class DataSourceManager:
@@ -23,24 +28,26 @@ class DataSourceManager:
         self.config = config
         self.cache = {}
         self.last_updated = {}
+        self.last_compaction_report = None
+        self._compaction_cache = {}  # include_github -> (inputs key, compacted sections)
+        self._compaction_lock = threading.Lock()
     
-    def load_pdf_content(self) -> str:
-        """Load LinkedIn PDF content."""
+    def load_pdf_pages(self) -> List[str]:
+        """Load LinkedIn PDF content as a list of page texts."""
         linkedin_path = self.config.get("linkedin_pdf_path", "me/linkedin.pdf")
         if not os.path.exists(linkedin_path):
-            return ""
+            return []
         
         try:
             reader = PdfReader(linkedin_path)
-            linkedin_text = ""
-            for page in reader.pages:
-                text = page.extract_text()
-                if text:
-                    linkedin_text += text
-            return linkedin_text
+            return [text for text in (page.extract_text() for page in reader.pages) if text]
         except Exception as e:
             print(f"Error reading LinkedIn PDF: {e}")
-            return ""
+            return []
+    
+    def load_pdf_content(self) -> str:
+        """Load LinkedIn PDF content."""
+        return "".join(self.load_pdf_pages())
     
     def load_summary_content(self) -> str:
         """Load summary text content."""
@@ -66,6 +73,12 @@ class DataSourceManager:
             if (datetime.now() - last_update).seconds < cache_duration:
                 return self.cache[cache_key]
         
+        # Offline runs can read a fixed GitHub section instead of calling the API
+        fixture_path = self.config.get("github_fixture_path")
+        if fixture_path:
+            with open(fixture_path, "r", encoding="utf-8") as f:
+                return f.read().strip()
+        
         # Fetch fresh data
         github_username = self.config.get("github_username")
         github_token = self.config.get("github_token")
@@ -84,26 +97,56 @@ class DataSourceManager:
     
     def get_comprehensive_profile(self, include_github: bool = True) -> str:
         """Get comprehensive profile combining all data sources."""
-        sections = []
+        compaction = self.config.get("profile_compaction", True)
+        raw = {}
+        pdf_pages = {}
         
         # Add summary
         summary = self.load_summary_content()
         if summary:
-            sections.append(f"## Summary\n{summary}")
+            raw["summary"] = summary
         
         # Add LinkedIn data
-        linkedin_content = self.load_pdf_content()
-        if linkedin_content:
-            sections.append(f"## LinkedIn Profile\n{linkedin_content}")
+        pages = self.load_pdf_pages()
+        if pages:
+            raw["linkedin"] = "".join(pages)
+            pdf_pages["linkedin"] = pages
         
         # Add GitHub data
         if include_github and self.config.get("github_username"):
             github_data = self.get_github_data()
             if github_data:
-                sections.append(github_data)
+                raw["github"] = github_data
         
-        return "\n\n".join(sections)
-
+        if compaction:
+            raw = self._compact(raw, pdf_pages, include_github)
+        
+        return render_sections(raw, PROFILE_HEADINGS)
+    
+    def _compact(self, sections: Dict[str, str], pdf_pages: Dict[str, List[str]],
+                 include_github: bool = True) -> Dict[str, str]:
+        """Compact profile sections, reusing the last result per variant while the inputs are unchanged."""
+        priority = self.config.get("profile_section_priority", ["summary", "github", "linkedin"])
+        ordered = {name: sections[name] for name in priority if name in sections}
+        ordered.update({name: text for name, text in sections.items() if name not in ordered})
+        budget = self.config.get("profile_token_budget")
+        
+        cache_key = (tuple(ordered.items()), budget,
+                     tuple((name, tuple(pages)) for name, pages in pdf_pages.items()))
+        # One slot per variant so callers alternating with/without GitHub both hit the cache;
+        # the lock keeps concurrent callers (e.g. evaluate.py's thread pool) from mixing them up
+        with self._compaction_lock:
+            cached = self._compaction_cache.get(include_github)
+            if cached and cached[0] == cache_key:
+                return cached[1]
+            
+            compacted, report = compact_sections(
+                ordered, token_budget=budget, pdf_pages=pdf_pages, headings=PROFILE_HEADINGS
+            )
+            self._compaction_cache[include_github] = (cache_key, compacted)
+            self.last_compaction_report = report
+        print(f"Profile compacted: {report['before']} -> {report['after']} tokens")
+        return compacted
 
 def create_default_config() -> Dict:
     """Create default configuration for data sources."""
@@ -114,7 +157,35 @@ def create_default_config() -> Dict:
         "linkedin_pdf_path": "me/linkedin.pdf",
         "summary_path": "me/summary.txt",
         "github_cache_duration": 3600,  # 1 hour in seconds
+        "github_fixture_path": None,  # Optional: file used instead of the GitHub API (offline evaluation)
         "prompt_style": "main",  # Options: "main", "professional", "casual"
+        "context_mode": "full",  # Options: "full", "no_github"
+        "profile_compaction": True,  # Normalize, strip PDF boilerplate and drop duplicate paragraphs
+        "profile_section_priority": ["summary", "github", "linkedin"],  # Highest priority first
+        "profile_token_budget": None,  # Optional hard cap; lowest-priority sections are trimmed first
+        # LLM endpoints in priority order; the router reorders them by rolling latency.
+        # Each entry: {"name", "model", optional "base_url", optional "api_key_env"}
+        "llm_endpoints": [
+            {"name": "openai", "model": "gpt-4o-mini"},
+        ],
+        "llm_hedge_after": 2.0,  # Seconds without a first token before hedging to the next endpoint
+        "llm_timeout": 60.0,  # Per-request timeout in seconds
+        "llm_max_in_flight": 2,  # Max concurrent attempts (primary + hedges) per request
+        "llm_rpm": 500,  # Requests-per-minute budget (None for unlimited)
+        "llm_tpm": 200000,  # Tokens-per-minute budget (None for unlimited)
+        "llm_max_output_tokens": 500,  # Completion allowance used when estimating request cost
+        "llm_max_queue_depth": 50,  # Waiting requests allowed before visitors get a "busy" reply
+        "llm_max_queue_wait": 20.0,  # Longest a request may wait for capacity, in seconds
+        "llm_rate_limit_retries": 2,  # Retries after a 429 (honoring Retry-After) before a "busy" reply
+        # Multi-worker mode: workers map the profile published by one refresher process
+        "profile_snapshot_path": os.getenv("PROFILE_SNAPSHOT_PATH"),
+        "api_workers": 1,  # Worker processes for api.py (>1 enables the shared profile snapshot)
+        "api_host": "127.0.0.1",  # Host for the JSON/SSE chat API (api.py)
+        "api_port": 7860,  # Port for the JSON/SSE chat API
+        "api_allowed_origins": ["*"],  # CORS origins allowed to embed the chat widget
+        "api_session_ttl": 3600,  # Seconds before an idle API session is discarded
+        "api_max_history_messages": 20,  # History messages kept per API session
+        "api_session_db": None,  # SQLite file for API sessions (multi-worker mode defaults to "sessions.db")
     }
 
 
@@ -152,5 +223,8 @@ if __name__ == "__main__":
     print("="*50)
     profile = dsm.get_comprehensive_profile()
     print(f"Total length: {len(profile)} characters")
+    if dsm.last_compaction_report:
+        print("\nCompaction report:")
+        print(format_report(dsm.last_compaction_report))
     print("\nFull content:")
     print(profile) 
\ No newline at end of file
@@ -0,0 +1,269 @@
+"""
+Offline batch evaluation comparing prompt styles and context modes.
+Runs a file of visitor questions through EnhancedMe and reports latency, tokens and tool-call rates.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+from app import EnhancedMe
+from data_sources import DataSourceManager, create_default_config
+
+
+PROMPT_STYLES = ["main", "professional", "casual"]
+CONTEXT_MODES = ["full", "no_github"]
+
+# Fixed GitHub section used with --stub so runs never touch the live API
+STUB_GITHUB_FIXTURE = "eval_github_fixture.md"
+
+# Keywords that make the stand-in LLM call a tool, so tool-call rates are exercised offline
+STUB_TOOL_TRIGGERS = {
+    "email": {"name": "record_user_details", "arguments": {"email": "visitor@example.com"}},
+    "salary": {"name": "record_unknown_question", "arguments": {"question": "What is your salary?"}},
+}
+
+
+def load_questions(path: str) -> List[str]:
+    """Load questions from a text file (one per line) or a JSONL file with a "question" field."""
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if path.endswith(".jsonl"):
+                line = json.loads(line)["question"]
+            questions.append(line)
+    return questions
+
+
+def dry_run_tool_calls(tool_calls) -> List[Dict]:
+    """Acknowledge tool calls without sending notifications."""
+    return [
+        {"role": "tool", "content": json.dumps({"recorded": "ok"}), "tool_call_id": tool_call.id}
+        for tool_call in tool_calls
+    ]
+
+
+def load_cache(path: str) -> Dict[str, Dict]:
+    """Load previously completed results keyed by cache key."""
+    cache = {}
+    if not os.path.exists(path):
+        return cache
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Partially written last line from an interrupted run
+                continue
+            cache[record["key"]] = record
+    return cache
+
+
+def cache_key(question: str, style: str, context_mode: str, fingerprint: str) -> str:
+    """Stable key for a (question, style, context mode, prompt/model) combination."""
+    raw = json.dumps([question, style, context_mode, fingerprint])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def build_assistants(config: Dict, styles: List[str], context_modes: List[str]) -> Dict:
+    """Create one EnhancedMe per style/context mode, sharing a single data source manager."""
+    data_manager = DataSourceManager(config)
+    # The same model name behind a different base URL is a different system under test
+    endpoints = [f"{endpoint['model']}@{endpoint.get('base_url') or 'default'}"
+                 for endpoint in config.get("llm_endpoints", [])]
+    assistants = {}
+    for style in styles:
+        for context_mode in context_modes:
+            me = EnhancedMe(dict(config, prompt_style=style, context_mode=context_mode))
+            me.data_manager = data_manager
+            # Fingerprint the prompt and endpoints so edits invalidate cached results
+            prompt_hash = hashlib.sha256(me.system_prompt().encode("utf-8")).hexdigest()
+            assistants[(style, context_mode)] = (me, f"{prompt_hash}:{','.join(endpoints)}")
+    return assistants
+
+
+def run_question(me: EnhancedMe, question: str) -> Dict:
+    """Run a single question and time it."""
+    start = time.monotonic()
+    try:
+        result = me.respond(question, [], tool_handler=dry_run_tool_calls)
+        error = None
+    except Exception as e:
+        result = {"content": None, "prompt_tokens": 0, "completion_tokens": 0, "tool_calls": []}
+        error = str(e)
+    return dict(result, latency=time.monotonic() - start, error=error)
+
+
+def run_evaluation(questions: List[str], config: Dict, styles: List[str], context_modes: List[str],
+                   workers: int = 4, cache_path: str = "eval_cache.jsonl") -> List[Dict]:
+    """
+    Run every question for every style and context mode, skipping cached results.
+
+    Args:
+        questions: Visitor questions to evaluate
+        config: Base application configuration
+        styles: Prompt styles to compare
+        context_modes: Context modes to compare
+        workers: Maximum concurrent requests
+        cache_path: JSONL file holding completed results (also used to resume)
+
+    Returns:
+        Result records for all requested combinations
+    """
+    cache = load_cache(cache_path)
+    assistants = build_assistants(config, styles, context_modes)
+
+    records, pending = [], []
+    for (style, context_mode), (me, fingerprint) in assistants.items():
+        for question in questions:
+            key = cache_key(question, style, context_mode, fingerprint)
+            if key in cache:
+                records.append(cache[key])
+            else:
+                pending.append((key, question, style, context_mode, me))
+
+    print(f"{len(records)} cached, {len(pending)} to run with {workers} workers")
+    lock = threading.Lock()
+    with open(cache_path, "a", encoding="utf-8") as cache_file, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(run_question, me, question): (key, question, style, context_mode)
+            for key, question, style, context_mode, me in pending
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            key, question, style, context_mode = futures[future]
+            record = dict(future.result(), key=key, question=question, style=style, context_mode=context_mode)
+            records.append(record)
+            # Only successful results are cached so failures are retried next run
+            if not record["error"]:
+                with lock:
+                    cache_file.write(json.dumps(record) + "\n")
+                    cache_file.flush()
+            status = "error" if record["error"] else f"{record['latency']:.2f}s"
+            print(f"[{done}/{len(pending)}] {style}/{context_mode}: {status}")
+
+    return records
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(records: List[Dict]) -> Dict[str, Dict]:
+    """Aggregate results per style/context mode."""
+    groups = {}
+    for record in records:
+        groups.setdefault(f"{record['style']}/{record['context_mode']}", []).append(record)
+
+    summary = {}
+    for name, group in sorted(groups.items()):
+        ok = [r for r in group if not r.get("error")]
+        count = len(ok) or 1
+        latencies = [r["latency"] for r in ok]
+        summary[name] = {
+            "questions": len(group),
+            "errors": len(group) - len(ok),
+            "avg_prompt_tokens": sum(r["prompt_tokens"] for r in ok) / count,
+            "avg_completion_tokens": sum(r["completion_tokens"] for r in ok) / count,
+            "p50_latency": percentile(latencies, 50),
+            "p95_latency": percentile(latencies, 95),
+            "tool_call_rate": sum(1 for r in ok if r["tool_calls"]) / count,
+        }
+    return summary
+
+
+def print_report(summary: Dict[str, Dict]):
+    """Print the summary as a table."""
+    header = f"{'style/context':<24}{'n':>5}{'err':>5}{'prompt':>9}{'compl':>8}{'p50 s':>8}{'p95 s':>8}{'tools':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in summary.items():
+        print(f"{name:<24}{stats['questions']:>5}{stats['errors']:>5}"
+              f"{stats['avg_prompt_tokens']:>9.0f}{stats['avg_completion_tokens']:>8.0f}"
+              f"{stats['p50_latency']:>8.2f}{stats['p95_latency']:>8.2f}{stats['tool_call_rate']:>8.0%}")
+
+
+def print_answers(records: List[Dict]):
+    """Print each question with the answer from every style/context mode."""
+    by_question = {}
+    for record in records:
+        by_question.setdefault(record["question"], []).append(record)
+    for question, group in by_question.items():
+        print(f"\nQ: {question}")
+        for record in sorted(group, key=lambda r: (r["style"], r["context_mode"])):
+            answer = record["content"] or f"<error: {record['error']}>"
+            print(f"  [{record['style']}/{record['context_mode']}] {answer}")
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Compare prompt styles on latency, tokens and answers.")
+    parser.add_argument("questions", help="Text file with one question per line, or JSONL with a 'question' field")
+    parser.add_argument("--styles", default=",".join(PROMPT_STYLES), help="Comma-separated prompt styles")
+    parser.add_argument("--context-modes", default=",".join(CONTEXT_MODES), help="Comma-separated context modes")
+    parser.add_argument("--workers", type=int, default=4, help="Maximum concurrent requests")
+    parser.add_argument("--cache", default="eval_cache.jsonl", help="Result cache / progress file")
+    parser.add_argument("--report", help="Optional path to write the JSON summary")
+    parser.add_argument("--show-answers", action="store_true", help="Print answers side by side")
+    parser.add_argument("--base-url", help="OpenAI-compatible endpoint to evaluate against")
+    parser.add_argument("--model", default="gpt-4o-mini", help="Model name for --base-url")
+    parser.add_argument("--stub", action="store_true", help="Run against a local stand-in LLM (no API calls)")
+    args = parser.parse_args(argv)
+
+    styles = args.styles.split(",")
+    context_modes = args.context_modes.split(",")
+    unknown = [s for s in styles if s not in PROMPT_STYLES] + [m for m in context_modes if m not in CONTEXT_MODES]
+    if unknown:
+        parser.error(f"unknown style/context mode: {', '.join(unknown)} "
+                     f"(styles: {', '.join(PROMPT_STYLES)}; context modes: {', '.join(CONTEXT_MODES)})")
+
+    config = create_default_config()
+    stub = None
+    if args.stub:
+        from stub_llm import StubLLMServer
+        stub = StubLLMServer(first_token_delay=0.05, token_delay=0.005, tool_triggers=STUB_TOOL_TRIGGERS).start()
+        config["llm_endpoints"] = [{"name": "stub", "model": "stub-model", "base_url": stub.base_url, "api_key": "stub"}]
+        config["github_fixture_path"] = STUB_GITHUB_FIXTURE
+    elif args.base_url:
+        config["llm_endpoints"] = [{"name": "custom", "model": args.model, "base_url": args.base_url}]
+
+    try:
+        records = run_evaluation(
+            load_questions(args.questions),
+            config,
+            styles=styles,
+            context_modes=context_modes,
+            workers=args.workers,
+            cache_path=args.cache,
+        )
+    finally:
+        if stub:
+            stub.stop()
+
+    summary = summarize(records)
+    print()
+    print_report(summary)
+    if args.show_answers:
+        print_answers(records)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
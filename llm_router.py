@@ -0,0 +1,315 @@
+"""
+LLM routing layer with hedged and fallback requests for tail-latency control.
+Holds an ordered list of OpenAI-compatible endpoints and picks the primary adaptively.
+"""
+import asyncio
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Optional
+
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
+
+
+class LLMEndpoint:
+    """A single OpenAI-compatible endpoint/model pair with rolling latency stats."""
+
+    def __init__(self, name: str, model: str, base_url: Optional[str] = None,
+                 api_key: Optional[str] = None, window: int = 20):
+        """
+        Initialize an endpoint.
+
+        Args:
+            name: Label used in logs and stats
+            model: Model name sent with each request
+            base_url: Optional base URL (defaults to the OpenAI API)
+            api_key: Optional API key (defaults to OPENAI_API_KEY)
+            window: Number of recent time-to-first-token samples to keep
+        """
+        self.name = name
+        self.model = model
+        # No SDK-level retries: the router falls back across endpoints and the
+        # scheduler owns rate-limit backoff
+        self.client = AsyncOpenAI(base_url=base_url, api_key=api_key, max_retries=0)
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record_latency(self, seconds: float):
+        """Record a time-to-first-token sample (failures are recorded as a penalty)."""
+        with self._lock:
+            self._latencies.append(seconds)
+
+    @property
+    def rolling_latency(self) -> Optional[float]:
+        """Median of recent time-to-first-token samples, or None if never measured."""
+        with self._lock:
+            if not self._latencies:
+                return None
+            return statistics.median(self._latencies)
+
+    async def open_stream(self, messages: List[Dict], tools: Optional[List[Dict]], timeout: float):
+        """Start a streaming chat completion against this endpoint."""
+        kwargs = {
+            "model": self.model,
+            "messages": messages,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+            "timeout": timeout,
+        }
+        if tools:
+            kwargs["tools"] = tools
+        return await self.client.chat.completions.create(**kwargs)
+
+
+class LLMRouter:
+    """Routes chat completions across endpoints with hedging and fallback."""
+
+    def __init__(self, endpoints: List[LLMEndpoint], hedge_after: float = 2.0,
+                 timeout: float = 60.0, max_in_flight: int = 2):
+        """
+        Initialize the router.
+
+        Args:
+            endpoints: Endpoints in configured priority order
+            hedge_after: Seconds to wait for a first token before hedging to the next endpoint
+            timeout: Per-request timeout, also used as the latency penalty for failures
+            max_in_flight: Maximum concurrent attempts for a single request
+        """
+        if not endpoints:
+            raise ValueError("LLMRouter needs at least one endpoint")
+        self.endpoints = endpoints
+        self.hedge_after = hedge_after
+        self.timeout = timeout
+        self.max_in_flight = max(1, max_in_flight)
+        # Attempts run on a private event loop so losing requests can be cancelled
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "LLMRouter":
+        """Build a router from the application configuration."""
+        endpoints = []
+        for spec in config.get("llm_endpoints") or [{"name": "openai", "model": "gpt-4o-mini"}]:
+            api_key_env = spec.get("api_key_env")
+            endpoints.append(LLMEndpoint(
+                name=spec.get("name", spec["model"]),
+                model=spec["model"],
+                base_url=spec.get("base_url"),
+                api_key=spec.get("api_key") or (os.getenv(api_key_env) if api_key_env else None),
+            ))
+        return cls(
+            endpoints,
+            hedge_after=config.get("llm_hedge_after", 2.0),
+            timeout=config.get("llm_timeout", 60.0),
+            max_in_flight=config.get("llm_max_in_flight", 2),
+        )
+
+    def ranked_endpoints(self) -> List[LLMEndpoint]:
+        """Endpoints ordered by rolling latency; unmeasured ones keep their configured order."""
+        def key(endpoint):
+            latency = endpoint.rolling_latency
+            return latency if latency is not None else float("inf")
+        return sorted(self.endpoints, key=key)
+
+    def stream(self, messages: List[Dict], tools: Optional[List[Dict]] = None,
+               admit_extra: Optional[Callable[[], bool]] = None) -> Iterator:
+        """
+        Stream chat completion chunks from whichever endpoint answers first.
+
+        The primary is tried first; if it hasn't produced a first token within
+        `hedge_after` seconds a duplicate request goes to the next endpoint and
+        the loser is cancelled as soon as a winner is known. Errors fall through
+        to the next endpoint immediately.
+
+        Args:
+            messages: Chat messages
+            tools: Optional tool definitions
+            admit_extra: Called before each hedge or fallback attempt; returning False
+                skips it (used to charge extra attempts to the rate-limit budget)
+        """
+        endpoint, stream, first_chunk = self._run(self._race(messages, tools, admit_extra))
+        try:
+            yield first_chunk
+            while True:
+                chunk = self._run(_next_chunk(stream))
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            self._run(stream.close())
+
+    def create(self, messages: List[Dict], tools: Optional[List[Dict]] = None,
+               admit_extra: Optional[Callable[[], bool]] = None) -> ChatCompletion:
+        """Run a hedged request and return the accumulated completion."""
+        return accumulate_chunks(self.stream(messages, tools, admit_extra))
+
+    def _run(self, coro):
+        """Run a coroutine on the router's event loop and wait for the result."""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _attempt(self, endpoint: LLMEndpoint, messages: List[Dict], tools: Optional[List[Dict]]):
+        """Open a stream and wait for its first chunk."""
+        start = time.monotonic()
+        try:
+            stream = await endpoint.open_stream(messages, tools, self.timeout)
+        except Exception as e:
+            endpoint.record_latency(self.timeout)
+            print(f"LLM endpoint {endpoint.name} failed: {e}")
+            raise
+        try:
+            first_chunk = await stream.__anext__()
+        except BaseException as e:
+            # Includes cancellation when another endpoint won the race
+            await stream.close()
+            if isinstance(e, Exception):
+                endpoint.record_latency(self.timeout)
+                print(f"LLM endpoint {endpoint.name} failed: {e}")
+            raise
+        endpoint.record_latency(time.monotonic() - start)
+        return stream, first_chunk
+
+    async def _race(self, messages: List[Dict], tools: Optional[List[Dict]],
+                    admit_extra: Optional[Callable[[], bool]] = None):
+        """Launch attempts in rank order and return the first one to yield a token."""
+        ranked = self.ranked_endpoints()
+        attempts = {}  # task -> (endpoint, started_at)
+
+        def launch(endpoint):
+            task = asyncio.ensure_future(self._attempt(endpoint, messages, tools))
+            attempts[task] = (endpoint, time.monotonic())
+
+        launch(ranked[0])
+        next_index = 1
+        last_error = None
+        hedging = True
+
+        def can_launch():
+            return next_index < len(ranked) and len(attempts) < self.max_in_flight
+
+        while attempts:
+            done, _ = await asyncio.wait(
+                attempts, timeout=self.hedge_after if hedging and can_launch() else None,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                if admit_extra is not None and not admit_extra():
+                    print("No rate-limit budget left for a hedge, waiting on the primary")
+                    hedging = False  # Fallbacks after an error are still tried
+                    continue
+                print(f"No first token after {self.hedge_after}s, hedging to {ranked[next_index].name}")
+                launch(ranked[next_index])
+                next_index += 1
+                continue
+
+            winner = None
+            for task in done:
+                endpoint, _ = attempts.pop(task)
+                if task.exception() is not None:
+                    last_error = task.exception()
+                elif winner is None:
+                    winner = (endpoint,) + task.result()
+                else:
+                    # Two attempts finished together: keep one, close the other
+                    await task.result()[0].close()
+
+            if winner is None:
+                # Fall back to the next endpoint right away, if the budget allows another request
+                if can_launch() and (admit_extra is None or admit_extra()):
+                    launch(ranked[next_index])
+                    next_index += 1
+                continue
+
+            # Cancel the losers now rather than letting them run to their first token.
+            # Their elapsed time is a lower bound on their latency, so record it.
+            for task, (endpoint, started_at) in attempts.items():
+                task.cancel()
+                endpoint.record_latency(time.monotonic() - started_at)
+            await asyncio.gather(*attempts, return_exceptions=True)
+            return winner
+
+        raise last_error or RuntimeError("No LLM endpoint produced a response")
+
+
+async def _next_chunk(stream):
+    """Next chunk from an async stream, or None when it is exhausted."""
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+def accumulate_chunks(chunks) -> ChatCompletion:
+    """Fold streamed chat completion chunks into a regular ChatCompletion."""
+    content_parts = []
+    tool_calls = {}
+    finish_reason = "stop"
+    usage = None
+    completion_id, created, model = "", 0, ""
+
+    for chunk in chunks:
+        completion_id = chunk.id or completion_id
+        created = chunk.created or created
+        model = chunk.model or model
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage.model_dump()
+        for choice in chunk.choices:
+            delta = choice.delta
+            if delta.content:
+                content_parts.append(delta.content)
+            for call in delta.tool_calls or []:
+                entry = tool_calls.setdefault(call.index, {
+                    "id": "", "type": "function", "function": {"name": "", "arguments": ""}
+                })
+                if call.id:
+                    entry["id"] = call.id
+                if call.function and call.function.name:
+                    entry["function"]["name"] += call.function.name
+                if call.function and call.function.arguments:
+                    entry["function"]["arguments"] += call.function.arguments
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+
+    message = {"role": "assistant", "content": "".join(content_parts) or None}
+    if tool_calls:
+        message["tool_calls"] = [tool_calls[i] for i in sorted(tool_calls)]
+
+    return ChatCompletion.model_validate({
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": finish_reason, "message": message}],
+        "usage": usage,
+    })
+
+
+# Example usage and testing
+if __name__ == "__main__":
+    from stub_llm import StubLLMServer
+
+    # Two stand-in servers: a slow primary and a fast secondary
+    with StubLLMServer(first_token_delay=1.5, reply="Answer from the slow endpoint.") as slow, \
+            StubLLMServer(first_token_delay=0.1, reply="Answer from the fast endpoint.") as fast:
+        router = LLMRouter([
+            LLMEndpoint("slow", "stub-model", base_url=slow.base_url, api_key="stub"),
+            LLMEndpoint("fast", "stub-model", base_url=fast.base_url, api_key="stub"),
+        ], hedge_after=0.3, timeout=10.0)
+
+        messages = [{"role": "user", "content": "Hi there"}]
+        for i in range(3):
+            start = time.monotonic()
+            primary = router.ranked_endpoints()[0].name
+            response = router.create(messages)
+            print(f"Request {i + 1}: primary={primary} "
+                  f"latency={time.monotonic() - start:.2f}s reply={response.choices[0].message.content!r}")
+
+        for endpoint in router.endpoints:
+            latency = endpoint.rolling_latency
+            print(f"{endpoint.name}: rolling TTFT " + (f"{latency:.2f}s" if latency is not None else "n/a"))
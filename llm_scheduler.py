@@ -0,0 +1,289 @@
+"""
+Request scheduler for LLM calls with RPM/TPM budgeting, fair queuing and backpressure.
+Sits in front of the LLM router so traffic spikes queue up instead of hitting 429s.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from profile_compaction import count_tokens
+
+
+class SchedulerBusy(Exception):
+    """Raised when a request can't be scheduled within the queue limits."""
+
+
+def estimate_request_tokens(messages: List, tools: Optional[List[Dict]] = None, max_output_tokens: int = 500) -> int:
+    """
+    Estimate the token cost of a chat completion before sending it.
+
+    Args:
+        messages: Chat messages (dicts or SDK message objects)
+        tools: Tool definitions sent with the request
+        max_output_tokens: Allowance for the completion
+
+    Returns:
+        Estimated prompt plus completion tokens
+    """
+    total = max_output_tokens
+    for message in messages:
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", None)
+        total += count_tokens(str(content or "")) + 4  # Per-message formatting overhead
+    if tools:
+        total += count_tokens(json.dumps(tools))
+    return total
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Return how long to back off for a rate-limit error, or None if it isn't one."""
+    if getattr(error, "status_code", None) != 429:
+        return None
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass  # HTTP-date form or garbage: use the default below
+    return 1.0
+
+
+class RequestScheduler:
+    """Admits LLM requests within RPM/TPM budgets, round-robin across sessions."""
+
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None,
+                 max_queue_depth: int = 50, max_wait: float = 20.0, window: float = 60.0,
+                 retries: int = 2):
+        """
+        Initialize the scheduler.
+
+        Args:
+            rpm: Requests-per-minute budget (None for unlimited)
+            tpm: Tokens-per-minute budget (None for unlimited)
+            max_queue_depth: Requests allowed to wait before new ones are rejected
+            max_wait: Longest a request may wait for a slot before it is rejected
+            window: Length of the budget window in seconds
+            retries: Extra attempts after a 429 before the visitor gets a busy reply
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_queue_depth = max_queue_depth
+        self.max_wait = max_wait
+        self.window = window
+        self.retries = retries
+        self.admitted = 0
+        self.rejected = 0
+        self.extra_attempts = 0
+        self._cond = threading.Condition()
+        self._queues = OrderedDict()  # session id -> deque of waiting tickets
+        self._sent = deque()  # [sent_at, tokens] for requests inside the window
+        self._paused_until = 0.0
+        self._waits = deque(maxlen=200)
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "RequestScheduler":
+        """Build a scheduler from the application configuration."""
+        return cls(
+            rpm=config.get("llm_rpm"),
+            tpm=config.get("llm_tpm"),
+            max_queue_depth=config.get("llm_max_queue_depth", 50),
+            max_wait=config.get("llm_max_queue_wait", 20.0),
+            retries=config.get("llm_rate_limit_retries", 2),
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of requests currently waiting."""
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    def stats(self) -> Dict:
+        """Snapshot of queue depth, wait times and budget usage."""
+        with self._cond:
+            now = time.monotonic()
+            self._prune(now)
+            waits = list(self._waits)
+            return {
+                "queue_depth": sum(len(q) for q in self._queues.values()),
+                "sessions_waiting": len(self._queues),
+                "requests_in_window": len(self._sent),
+                "tokens_in_window": sum(tokens for _, tokens in self._sent),
+                "avg_wait": sum(waits) / len(waits) if waits else 0.0,
+                "max_wait": max(waits) if waits else 0.0,
+                "paused_for": max(0.0, self._paused_until - now),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "extra_attempts": self.extra_attempts,
+            }
+
+    def pause(self, seconds: float):
+        """Stop admitting requests for `seconds` (e.g. after a 429 with Retry-After)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+        print(f"LLM rate limited, pausing scheduler for {seconds:.1f}s")
+
+    def acquire(self, session_id: str, tokens: int) -> List:
+        """
+        Block until the request may be sent.
+
+        Args:
+            session_id: Visitor session, used for fair queuing
+            tokens: Estimated token cost of the request
+
+        Returns:
+            Budget entry for the request (pass to `record_usage` once the real cost is known)
+
+        Raises:
+            SchedulerBusy: If the queue is full or the wait would exceed `max_wait`
+        """
+        with self._cond:
+            if self.queue_depth >= self.max_queue_depth:
+                self.rejected += 1
+                raise SchedulerBusy("LLM request queue is full")
+
+            ticket = object()
+            self._queues.setdefault(session_id, deque()).append(ticket)
+            start = time.monotonic()
+            deadline = start + self.max_wait
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self._delay(tokens, now) if self._is_next(session_id, ticket) else None
+                    if delay is not None and delay <= 0:
+                        return self._admit(session_id, tokens, now, start)
+                    remaining = deadline - now
+                    if remaining <= 0 or (delay is not None and delay > remaining):
+                        raise SchedulerBusy(f"No LLM capacity within {self.max_wait}s")
+                    self._cond.wait(min(delay, remaining) if delay is not None else remaining)
+            except SchedulerBusy:
+                self._remove(session_id, ticket)
+                self.rejected += 1
+                self._cond.notify_all()
+                raise
+
+    def try_acquire(self, tokens: int) -> Optional[List]:
+        """
+        Charge an extra attempt for an admitted request (a hedge or fallback) if the budget has room now.
+
+        Extra attempts don't queue: if the budget is full the router simply doesn't send them.
+
+        Args:
+            tokens: Estimated token cost of the attempt
+
+        Returns:
+            Budget entry for the attempt, or None if it would exceed the budget
+        """
+        with self._cond:
+            now = time.monotonic()
+            if self._delay(tokens, now) > 0:
+                return None
+            entry = [now, tokens]
+            self._sent.append(entry)
+            self.extra_attempts += 1
+            return entry
+
+    def record_usage(self, entry: List, tokens: int):
+        """Replace a request's estimated token cost with the actual usage."""
+        with self._cond:
+            entry[1] = tokens
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, session_id: str, tokens: int):
+        """Context manager that acquires a slot and backs off on rate-limit errors."""
+        entry = self.acquire(session_id, tokens)
+        try:
+            yield entry
+        except Exception as e:
+            retry_after = retry_after_seconds(e)
+            if retry_after is not None:
+                self.pause(retry_after)
+            raise
+
+    def submit(self, session_id: str, tokens: int, fn, retries: Optional[int] = None):
+        """
+        Run `fn()` once a slot is available, retrying after rate-limit errors.
+
+        Args:
+            session_id: Visitor session, used for fair queuing
+            tokens: Estimated token cost of the request
+            fn: Callable that performs the LLM request
+            retries: Extra attempts after a 429 (defaults to the scheduler's setting)
+
+        Returns:
+            Whatever `fn` returns
+
+        Raises:
+            SchedulerBusy: If the request is still rate limited after all retries
+        """
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                with self.slot(session_id, tokens) as entry:
+                    result = fn()
+                usage = getattr(result, "usage", None)
+                if usage is not None:
+                    self.record_usage(entry, usage.total_tokens)
+                return result
+            except Exception as e:
+                if retry_after_seconds(e) is None:
+                    raise
+                if attempt == retries:
+                    raise SchedulerBusy("LLM still rate limited after retries") from e
+
+    def _is_next(self, session_id: str, ticket) -> bool:
+        """Sessions take turns: the head of the first session queue goes next."""
+        for queue_session, queue in self._queues.items():
+            return queue_session == session_id and queue[0] is ticket
+        return False
+
+    def _admit(self, session_id: str, tokens: int, now: float, start: float) -> List:
+        queue = self._queues[session_id]
+        queue.popleft()
+        if queue:
+            self._queues.move_to_end(session_id)
+        else:
+            del self._queues[session_id]
+        entry = [now, tokens]
+        self._sent.append(entry)
+        self._waits.append(now - start)
+        self.admitted += 1
+        self._cond.notify_all()
+        return entry
+
+    def _remove(self, session_id: str, ticket):
+        queue = self._queues.get(session_id)
+        if queue is None:
+            return
+        queue.remove(ticket)
+        if not queue:
+            del self._queues[session_id]
+
+    def _prune(self, now: float):
+        while self._sent and self._sent[0][0] <= now - self.window:
+            self._sent.popleft()
+
+    def _delay(self, tokens: int, now: float) -> float:
+        """Seconds until a request of `tokens` fits the budgets (<= 0 means now)."""
+        self._prune(now)
+        delay = self._paused_until - now
+
+        if self.rpm and len(self._sent) >= self.rpm:
+            delay = max(delay, self._sent[len(self._sent) - self.rpm][0] + self.window - now)
+
+        if self.tpm:
+            excess = sum(t for _, t in self._sent) + tokens - self.tpm
+            # Oversized requests still go through once the window is empty
+            for sent_at, sent_tokens in self._sent:
+                if excess <= 0:
+                    break
+                excess -= sent_tokens
+                delay = max(delay, sent_at + self.window - now)
+
+        return delay
@@ -0,0 +1,265 @@
+"""
+Profile compaction for the LLM Alter Ego chatbot.
+Normalizes whitespace, strips PDF boilerplate, removes near-duplicate paragraphs across
+sources and optionally trims the profile to a token budget.
+"""
+import math
+import re
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # Optional: falls back to a character-based estimate
+    tiktoken = None
+
+
+_PAGE_FOOTER = re.compile(r"^\s*page\s+\d+\s+(of|/)\s+\d+\s*$", re.IGNORECASE)
+_LINE_END_HYPHEN = re.compile(r"(\w+)-\n(\w+)")
+_SENTENCE_END = re.compile(r"[.!?:]$")
+_WORD = re.compile(r"\w+")
+# Only the first/last few lines of a page can be running headers or footers
+_EDGE_LINES = 2
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens locally (tiktoken if installed, otherwise ~4 characters per token)."""
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        return len(_encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def normalize_whitespace(text: str) -> str:
+    """Collapse runs of spaces and blank lines while keeping line structure."""
+    text = text.replace("\u00a0", " ").replace("\t", " ").replace("\r", "")
+    lines = [re.sub(r" {2,}", " ", line).strip() for line in text.split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def _join_line_end_hyphens(text: str) -> str:
+    """
+    Rejoin words split across lines at a hyphen.
+
+    pypdf output from LinkedIn exports wraps at spaces, so a hyphen at a line end is
+    usually a real compound (e.g. `langgraph-supervisor`). The hyphen is only dropped
+    when the joined word also appears elsewhere in the text.
+    """
+    vocabulary = {word.lower() for word in _WORD.findall(text)}
+
+    def join(match):
+        joined = match.group(1) + match.group(2)
+        if joined.lower() in vocabulary:
+            return joined
+        return f"{match.group(1)}-{match.group(2)}"
+
+    return _LINE_END_HYPHEN.sub(join, text)
+
+
+def strip_pdf_boilerplate(pages: List[str]) -> str:
+    """
+    Join PDF pages, dropping page footers, running headers and line-break hyphenation.
+
+    Args:
+        pages: Extracted text of each page
+
+    Returns:
+        Cleaned text of the whole document
+    """
+    page_lines = [[line.strip() for line in page.splitlines() if line.strip()] for page in pages]
+
+    # Short lines repeated at the top or bottom of most pages are running headers/footers.
+    # Small documents need the line on every page, so repeated content (job locations,
+    # titles) isn't mistaken for boilerplate.
+    repeated = set()
+    if len(pages) > 1:
+        counts = {}
+        for lines in page_lines:
+            edges = set(lines[:_EDGE_LINES] + lines[-_EDGE_LINES:])
+            for line in edges:
+                if len(line.split()) <= 8:
+                    counts[line] = counts.get(line, 0) + 1
+        threshold = len(pages) if len(pages) <= 3 else math.ceil(len(pages) / 2)
+        repeated = {line for line, count in counts.items() if count >= threshold}
+
+    kept = []
+    for lines in page_lines:
+        last = len(lines) - 1
+        for i, line in enumerate(lines):
+            at_edge = i < _EDGE_LINES or i > last - _EDGE_LINES
+            if (at_edge and line in repeated) or _PAGE_FOOTER.match(line) or line == "\x0c":
+                continue
+            kept.append(line)
+
+    return _join_line_end_hyphens("\n".join(kept))
+
+
+def _split_blocks(text: str) -> List[List[str]]:
+    """
+    Split text into blocks (separated by blank lines) of paragraph units.
+
+    PDF extracts rarely have blank lines, so inside a block a line ending with
+    sentence punctuation also closes the current paragraph.
+    """
+    blocks = []
+    for block in text.split("\n\n"):
+        paragraphs, current = [], []
+        for line in block.split("\n"):
+            current.append(line)
+            if _SENTENCE_END.search(line):
+                paragraphs.append("\n".join(current))
+                current = []
+        if current:
+            paragraphs.append("\n".join(current))
+        paragraphs = [p for p in paragraphs if p.strip()]
+        if paragraphs:
+            blocks.append(paragraphs)
+    return blocks
+
+
+def _join_blocks(blocks: List[List[str]]) -> str:
+    return "\n\n".join("\n".join(paragraphs) for paragraphs in blocks if paragraphs)
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Split text into paragraph units (see `_split_blocks`)."""
+    return [paragraph for block in _split_blocks(text) for paragraph in block]
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = _WORD.findall(text.lower())
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def remove_near_duplicates(sections: Dict[str, str], threshold: float = 0.8,
+                           min_words: int = 8) -> Dict[str, str]:
+    """
+    Drop paragraphs already covered by an earlier (higher-priority) section.
+
+    A paragraph is a near-duplicate when at least `threshold` of its word 3-grams
+    appear in text kept so far. Short paragraphs (headings, bullets) are always kept.
+
+    Args:
+        sections: Section name -> text, in priority order
+        threshold: Fraction of shared 3-grams above which a paragraph is dropped
+        min_words: Paragraphs with fewer words are never dropped
+
+    Returns:
+        Sections with duplicated paragraphs removed
+    """
+    seen = set()
+    result = {}
+    for name, text in sections.items():
+        blocks = []
+        for block in _split_blocks(text):
+            kept = []
+            for paragraph in block:
+                shingles = _shingles(paragraph)
+                long_enough = len(_WORD.findall(paragraph)) >= min_words
+                if long_enough and len(shingles & seen) / len(shingles) >= threshold:
+                    continue
+                kept.append(paragraph)
+            blocks.append(kept)
+        # Only compare against other sources: repeats within one section are left alone
+        for block in blocks:
+            for paragraph in block:
+                seen |= _shingles(paragraph)
+        result[name] = _join_blocks(blocks)
+    return result
+
+
+def render_sections(sections: Dict[str, str], headings: Optional[Dict[str, str]] = None) -> str:
+    """
+    Join sections into the profile text, each under its heading.
+
+    Args:
+        sections: Section name -> text
+        headings: Optional section name -> heading prefix; when given, it also sets the
+            output order and which sections are included
+
+    Returns:
+        Sections separated by blank lines (empty sections are skipped)
+    """
+    names = headings if headings is not None else sections
+    return "\n\n".join((headings or {}).get(name, "") + sections[name] for name in names if sections.get(name))
+
+
+def apply_token_budget(sections: Dict[str, str], budget: int,
+                       headings: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """
+    Trim sections to fit a token budget, cutting from the lowest-priority section first.
+
+    Args:
+        sections: Section name -> text, in priority order
+        budget: Maximum tokens for the rendered profile, headings and separators included
+        headings: Optional section name -> heading prefix, as passed to `render_sections`
+
+    Returns:
+        Sections that fit the budget (emptied sections are removed)
+    """
+    result = dict(sections)
+    for name in reversed(list(result)):
+        if count_tokens(render_sections(result, headings)) <= budget:
+            break
+        blocks = _split_blocks(result[name])
+        result[name] = _join_blocks(blocks)
+        while blocks and count_tokens(render_sections(result, headings)) > budget:
+            blocks[-1].pop()
+            if not blocks[-1]:
+                blocks.pop()
+            result[name] = _join_blocks(blocks)
+    return {name: text for name, text in result.items() if text}
+
+
+def compact_sections(sections: Dict[str, str], token_budget: Optional[int] = None,
+                     duplicate_threshold: float = 0.8, pdf_pages: Optional[Dict[str, List[str]]] = None,
+                     headings: Optional[Dict[str, str]] = None):
+    """
+    Run the full compaction pass over profile sections.
+
+    Args:
+        sections: Section name -> raw text, in priority order (highest first)
+        token_budget: Optional hard cap on total tokens
+        duplicate_threshold: Similarity above which paragraphs count as duplicates
+        pdf_pages: Optional section name -> extracted PDF pages; these sections are
+            rebuilt from their pages with boilerplate stripped
+        headings: Optional section name -> heading prefix, counted against the budget
+
+    Returns:
+        Tuple of (compacted sections, report dict with per-section token counts)
+    """
+    pdf_pages = pdf_pages or {}
+    compacted = {
+        name: normalize_whitespace(strip_pdf_boilerplate(pdf_pages[name]) if name in pdf_pages else text)
+        for name, text in sections.items()
+    }
+    compacted = remove_near_duplicates(compacted, threshold=duplicate_threshold)
+    if token_budget:
+        compacted = apply_token_budget(compacted, token_budget, headings)
+
+    report = {"sections": {}, "token_budget": token_budget}
+    for name, text in sections.items():
+        report["sections"][name] = {
+            "before": count_tokens(text),
+            "after": count_tokens(compacted.get(name, "")),
+        }
+    report["before"] = sum(s["before"] for s in report["sections"].values())
+    report["after"] = sum(s["after"] for s in report["sections"].values())
+    return compacted, report
+
+
+def format_report(report: Dict) -> str:
+    """Format a compaction report as a small table."""
+    lines = [f"{'section':<16}{'before':>8}{'after':>8}{'saved':>8}"]
+    rows = list(report["sections"].items()) + [("total", {"before": report["before"], "after": report["after"]})]
+    for name, counts in rows:
+        saved = 1 - counts["after"] / counts["before"] if counts["before"] else 0
+        lines.append(f"{name:<16}{counts['before']:>8}{counts['after']:>8}{saved:>8.0%}")
+    if report.get("token_budget"):
+        lines.append(f"(token budget: {report['token_budget']})")
+    return "\n".join(lines)
@@ -0,0 +1,246 @@
+"""
+Shared, memory-mapped profile snapshots for multi-worker deployments.
+One refresher process compiles the profile and publishes it as a versioned file;
+workers map it read-only and pick up new versions via a header generation counter.
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import Dict, Optional
+
+from data_sources import DataSourceManager, create_default_config
+
+
+# Header: magic, format version, sequence (odd while a write is in progress),
+# generation, data length, data CRC32
+_HEADER = struct.Struct("<4sIQQQI4x")
+_MAGIC = b"AEPS"
+_FORMAT_VERSION = 1
+_SEQ = struct.Struct("<Q")
+_SEQ_OFFSET = 8
+_INDEX_LENGTH = struct.Struct("<I")
+# Header reads give up after this many torn/odd reads (roughly a second)
+_READ_RETRIES = 1100
+
+
+def _data_path(path: str, generation: int) -> str:
+    return f"{path}.{generation}"
+
+
+class ProfileSnapshotWriter:
+    """Publishes profile snapshots. Only one writer (the refresher) may exist per path."""
+
+    def __init__(self, path: str):
+        """
+        Initialize the writer, creating the header file if needed.
+
+        Args:
+            path: Header file path; data files are written next to it as `<path>.<generation>`
+        """
+        self.path = path
+        if not os.path.exists(path) or os.path.getsize(path) != _HEADER.size:
+            # Replace rather than truncate: workers may still map the old file
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, 0, 0, 0, 0))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        self._file = open(path, "r+b")
+        self._header = mmap.mmap(self._file.fileno(), _HEADER.size)
+        self._digest = None
+        # A writer that died mid-publish leaves the sequence odd; round it up so readers stop waiting
+        seq = _SEQ.unpack_from(self._header, _SEQ_OFFSET)[0]
+        if seq % 2:
+            _SEQ.pack_into(self._header, _SEQ_OFFSET, seq + 1)
+            self._header.flush()
+
+    @property
+    def generation(self) -> int:
+        """Generation of the last published snapshot (0 if none yet)."""
+        return _HEADER.unpack_from(self._header)[3]
+
+    def publish(self, sections: Dict[str, str]) -> int:
+        """
+        Publish a new snapshot if the content changed.
+
+        Args:
+            sections: Section name -> text (e.g. "full" and "no_github" profiles)
+
+        Returns:
+            Generation now being served
+        """
+        digest = hashlib.sha256(json.dumps(sections, sort_keys=True).encode("utf-8")).hexdigest()
+        if digest == self._digest:
+            return self.generation
+
+        # Layout: index length, JSON index of {name: [offset, length]}, then UTF-8 blobs
+        blobs = {name: text.encode("utf-8") for name, text in sections.items()}
+        index, offset = {}, 0
+        for name, blob in blobs.items():
+            index[name] = [offset, len(blob)]
+            offset += len(blob)
+        index_bytes = json.dumps(index).encode("utf-8")
+        data = _INDEX_LENGTH.pack(len(index_bytes)) + index_bytes + b"".join(blobs.values())
+
+        _, _, seq, generation, _, _ = _HEADER.unpack_from(self._header)
+        generation += 1
+        tmp_path = _data_path(self.path, generation) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, _data_path(self.path, generation))
+
+        # Seqlock: readers retry while the sequence is odd or changes under them.
+        # Start from an even base so the parity stays right even after an interrupted write.
+        base = seq + (seq & 1)
+        _SEQ.pack_into(self._header, _SEQ_OFFSET, base + 1)
+        _HEADER.pack_into(self._header, 0, _MAGIC, _FORMAT_VERSION, base + 1, generation, len(data), zlib.crc32(data))
+        _SEQ.pack_into(self._header, _SEQ_OFFSET, base + 2)
+        self._header.flush()
+        self._digest = digest
+
+        # Keep the previous generation for readers that are mid-switch; older ones can go
+        # (workers that still map them keep a valid mapping until they move on)
+        for old in range(max(1, generation - 5), generation - 1):
+            try:
+                os.remove(_data_path(self.path, old))
+            except OSError:
+                pass
+        return generation
+
+    def close(self):
+        """Release the header mapping."""
+        self._header.close()
+        self._file.close()
+
+
+class ProfileSnapshotReader:
+    """Read-only view of the latest published snapshot. The read path takes no locks."""
+
+    def __init__(self, path: str):
+        """
+        Initialize the reader. The snapshot is mapped lazily on first use.
+
+        Args:
+            path: Header file path used by the refresher
+        """
+        self.path = path
+        self._header = None
+        # (generation, data mapping, index) swapped as one reference so concurrent
+        # readers in the same worker never mix an index with the wrong mapping
+        self._snapshot = (0, None, {})
+
+    @property
+    def generation(self) -> int:
+        """Generation currently mapped (0 if none yet)."""
+        return self._snapshot[0]
+
+    def get(self, name: str) -> str:
+        """
+        Return a section of the current snapshot, remapping if a newer one was published.
+
+        Raises:
+            FileNotFoundError: If nothing has been published yet
+            KeyError: If the snapshot has no such section
+        """
+        _, data, index = self._refresh()
+        offset, length = index[name]
+        return data[offset:offset + length].decode("utf-8")
+
+    def _read_header(self):
+        """Consistent (generation, length, crc) from the header via the seqlock."""
+        if self._header is None:
+            with open(self.path, "rb") as f:
+                self._header = mmap.mmap(f.fileno(), _HEADER.size, access=mmap.ACCESS_READ)
+        for attempt in range(_READ_RETRIES):
+            magic, version, seq, generation, length, crc = _HEADER.unpack_from(self._header)
+            if magic != _MAGIC or version != _FORMAT_VERSION:
+                self._header = None  # Remap next time in case the header file was replaced
+                raise ValueError(f"{self.path} is not a profile snapshot")
+            if seq % 2 == 0 and _HEADER.unpack_from(self._header)[2] == seq:
+                return generation, length, crc
+            # A publish only takes microseconds; back off in case the writer is descheduled
+            time.sleep(0 if attempt < 100 else 0.001)
+        self._header = None
+        raise ValueError(f"Profile snapshot header at {self.path} stayed mid-write (writer died?)")
+
+    def _refresh(self):
+        snapshot = self._snapshot
+        while True:
+            generation, length, crc = self._read_header()
+            if generation == snapshot[0] and snapshot[1] is not None:
+                return snapshot
+            if generation == 0:
+                raise FileNotFoundError(f"No profile snapshot published at {self.path} yet")
+            try:
+                with open(_data_path(self.path, generation), "rb") as f:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                break
+            except FileNotFoundError:
+                # The refresher moved on and cleaned up while we were switching; retry
+                if self._read_header()[0] == generation:
+                    raise
+        if len(data) != length or zlib.crc32(data) != crc:
+            data.close()
+            raise ValueError(f"Profile snapshot generation {generation} failed validation")
+
+        index_length = _INDEX_LENGTH.unpack_from(data)[0]
+        start = _INDEX_LENGTH.size + index_length
+        index = json.loads(data[_INDEX_LENGTH.size:start].decode("utf-8"))
+        # Swap in the new mapping; the old one is released with its last reference
+        index = {name: (start + offset, size) for name, (offset, size) in index.items()}
+        self._snapshot = (generation, data, index)
+        print(f"Mapped profile snapshot generation {generation}")
+        return self._snapshot
+
+
+def compile_profile(data_manager: DataSourceManager, force_refresh: bool = False) -> Dict[str, str]:
+    """Build the profile variants every worker needs."""
+    if force_refresh:
+        data_manager.get_github_data(force_refresh=True)
+    return {
+        "full": data_manager.get_comprehensive_profile(include_github=True),
+        "no_github": data_manager.get_comprehensive_profile(include_github=False),
+    }
+
+
+def run_refresher(config: Dict, path: str, interval: Optional[float] = None):
+    """
+    Compile and publish the profile, then keep refreshing it.
+
+    Args:
+        config: Application configuration
+        path: Snapshot header path
+        interval: Seconds between refreshes (defaults to the GitHub cache duration)
+    """
+    interval = interval or config.get("github_cache_duration", 3600)
+    data_manager = DataSourceManager(config)
+    writer = ProfileSnapshotWriter(path)
+    try:
+        force_refresh = False
+        while True:
+            try:
+                generation = writer.publish(compile_profile(data_manager, force_refresh))
+                print(f"Profile snapshot at generation {generation}")
+            except Exception as e:
+                print(f"Error refreshing profile snapshot: {e}")
+            time.sleep(interval)
+            force_refresh = True
+    finally:
+        writer.close()
+
+
+# Run the refresher standalone
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish the compiled profile for workers to map.")
+    parser.add_argument("--path", default=os.getenv("PROFILE_SNAPSHOT_PATH", "profile.snap"))
+    parser.add_argument("--interval", type=float, help="Seconds between refreshes")
+    args = parser.parse_args()
+    run_refresher(create_default_config(), args.path, args.interval)
@@ -0,0 +1,194 @@
+"""
+Local stand-in for an OpenAI-compatible chat completions endpoint.
+Used to exercise LLM routing, hedging and evaluation runs without calling the real API.
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+
+class StubLLMServer:
+    """Minimal OpenAI-compatible server with a configurable latency profile."""
+
+    def __init__(self, port: int = 0, first_token_delay: float = 0.0, token_delay: float = 0.0,
+                 reply: str = "Hello from the stand-in model.", name: str = "stub",
+                 tool_triggers: Optional[Dict[str, Dict]] = None):
+        """
+        Initialize the stand-in server.
+
+        Args:
+            port: Port to listen on (0 picks a free port)
+            first_token_delay: Seconds to wait before sending the first token
+            token_delay: Seconds to wait between subsequent tokens
+            reply: Text returned for every completion
+            name: Name reported in logs and the response model field
+            tool_triggers: Optional map of keyword -> {"name", "arguments"}; when the latest
+                user message contains the keyword the first reply is that tool call
+        """
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.reply = reply
+        self.name = name
+        self.tool_triggers = tool_triggers or {}
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        """Base URL to pass to an OpenAI client."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubLLMServer":
+        """Start serving in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the server."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with stub._lock:
+                    stub.request_count += 1
+                try:
+                    if body.get("stream"):
+                        stub._send_stream(self, body)
+                    else:
+                        stub._send_completion(self, body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client cancelled the request (e.g. the losing side of a hedge)
+                    pass
+
+        return Handler
+
+    def _tool_call(self, body: Dict) -> Optional[Dict]:
+        """Return the tool call to emit for this request, if any."""
+        messages = body.get("messages", [])
+        if not messages or messages[-1].get("role") != "user" or not body.get("tools"):
+            return None
+        text = str(messages[-1].get("content") or "").lower()
+        for keyword, call in self.tool_triggers.items():
+            if keyword.lower() in text:
+                return {
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                    "type": "function",
+                    "function": {"name": call["name"], "arguments": json.dumps(call.get("arguments", {}))},
+                }
+        return None
+
+    def _usage(self, body: Dict) -> Dict:
+        prompt_chars = sum(len(str(m.get("content") or "")) for m in body.get("messages", []))
+        prompt_tokens = max(1, prompt_chars // 4)
+        completion_tokens = max(1, len(self.reply) // 4)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _send_completion(self, handler: BaseHTTPRequestHandler, body: Dict):
+        time.sleep(self.first_token_delay)
+        tool_call = self._tool_call(body)
+        message = {"role": "assistant", "content": self.reply}
+        if tool_call:
+            message = {"role": "assistant", "content": None, "tool_calls": [tool_call]}
+        payload = {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", self.name),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "tool_calls" if tool_call else "stop",
+                "message": message,
+            }],
+            "usage": self._usage(body),
+        }
+        data = json.dumps(payload).encode("utf-8")
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _send_stream(self, handler: BaseHTTPRequestHandler, body: Dict):
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", self.name)
+
+        def chunk(delta: Dict, finish_reason: Optional[str] = None, usage: Optional[Dict] = None) -> bytes:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if usage:
+                payload["usage"] = usage
+            return f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+
+        time.sleep(self.first_token_delay)
+        handler.wfile.write(chunk({"role": "assistant", "content": ""}))
+        tool_call = self._tool_call(body)
+        if tool_call:
+            handler.wfile.write(chunk({"tool_calls": [dict(tool_call, index=0)]}))
+            handler.wfile.write(chunk({}, finish_reason="tool_calls"))
+        else:
+            for i, word in enumerate(self.reply.split(" ")):
+                if i:
+                    time.sleep(self.token_delay)
+                handler.wfile.write(chunk({"content": word if i == 0 else f" {word}"}))
+                handler.wfile.flush()
+            handler.wfile.write(chunk({}, finish_reason="stop"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            handler.wfile.write(chunk({}, usage=self._usage(body)))
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+        handler.close_connection = True
+
+
+# Example usage and testing
+if __name__ == "__main__":
+    with StubLLMServer(port=8001, first_token_delay=0.2) as server:
+        print(f"Stand-in LLM listening on {server.base_url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass